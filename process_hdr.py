@@ -1,17 +1,18 @@
 import os
-import HDRutils
-from HDRutils.merge import merge 
+import numpy as np
 
 dataset_path = "sihdr/raw"
 scene_id = "064"  # Change for different scenes
 scene_path = os.path.join(dataset_path, scene_id)
 
-if not os.path.exists(scene_path):
+# scandir doubles as the existence check and hands back names without extra stat calls
+try:
+    with os.scandir(scene_path) as entries:
+        image_files = sorted(e.path for e in entries if e.name.endswith('.CR2'))
+except FileNotFoundError:
     print(f"Error: The folder '{scene_path}' does not exist.")
     exit()
 
-image_files = sorted([os.path.join(scene_path, f) for f in os.listdir(scene_path) if f.endswith('.CR2')])
-
 if not image_files:
     print(f"Error: No RAW (.CR2) images found in {scene_path}.")
     exit()
@@ -19,9 +20,15 @@ if not image_files:
 file_names = [f"'{os.path.basename(f)}'" for f in image_files]
 print(f"files = [{', '.join(file_names)}]")
 
+# HDRutils drags in a heavy dependency tree, so only import it once there is work to do
+import HDRutils
+from HDRutils.merge import merge
+
 # Merge with exposure estimation enabled
 hdr_image = merge(image_files, estimate_exp='mst')[0]
 
 hdr_output_path = f"hdr_outputs/HDR_{scene_id}.exr"
-HDRutils.io.imwrite(hdr_output_path, hdr_image)
+# Half precision covers the merged dynamic range and halves the EXR size; clamp so nothing overflows to inf
+hdr_half = np.minimum(hdr_image, np.finfo(np.float16).max).astype(np.float16)
+HDRutils.io.imwrite(hdr_output_path, hdr_half)
 print(f"HDR image saved: {hdr_output_path}")
\ No newline at end of file
@@ -1,10 +1,101 @@
 import os
+# Must be set before cv2 is imported for EXR support to be enabled
+os.environ.setdefault('OPENCV_IO_ENABLE_OPENEXR', '1')
+import io
+import re
+import json
+import hashlib
+import tempfile
+import functools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import cv2
 import numpy as np
 
-def merge_hdr_opencv(image_paths, exposure_times=None, output_dir="hdr_outputsopencv", output_prefix="HDR", tone_mapping=True):
+# Half-float, ZIP-compressed EXR; radiance is clamped to the float16 maximum before writing
+EXR_WRITE_PARAMS = [
+    cv2.IMWRITE_EXR_TYPE, cv2.IMWRITE_EXR_TYPE_HALF,
+    cv2.IMWRITE_EXR_COMPRESSION, cv2.IMWRITE_EXR_COMPRESSION_ZIP,
+]
+
+# Quality 90 is visually indistinguishable from the default 95 here and encodes faster and smaller
+JPEG_WRITE_PARAMS = [
+    cv2.IMWRITE_JPEG_QUALITY, 90,
+    cv2.IMWRITE_JPEG_PROGRESSIVE, 0,
+    cv2.IMWRITE_JPEG_OPTIMIZE, 0,
+]
+
+EXIF_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "hdr_exif.json")
+
+def _save_npy(path, array):
+    """
+    Write a .npy atomically so an interrupted or concurrent run never leaves a truncated file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+def _load_npy(path, mmap_mode='r'):
+    """
+    Load a cached .npy, or return None if it is missing or unreadable so callers treat it as a miss.
+    """
+    try:
+        return np.load(path, mmap_mode=mmap_mode)
+    except (OSError, ValueError):
+        return None
+
+def _aligned_cache_path(cache_dir, align_cache_key):
+    return os.path.join(cache_dir, f"{align_cache_key}_mtb.npy")
+
+def _needs_alignment(images, threshold=0.1, size=256, exclude_range=4):
+    """
+    Cheap motion check on downsampled median threshold bitmaps of adjacent exposures.
+    
+    Thresholding each frame at its own median makes the bitmaps largely exposure-invariant,
+    so a large share of differing pixels points at camera or subject motion. As in MTB, pixels
+    within exclude_range of the median are ignored, and frames whose median falls in the black
+    or saturated band carry no usable structure and are skipped.
+    """
+    bitmaps = []
+    for img in images:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        scale = size / max(gray.shape)
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        median = float(np.median(small))
+        if median <= exclude_range or median >= 255 - exclude_range:
+            continue
+        _, bitmap = cv2.threshold(small, median, 255, cv2.THRESH_BINARY)
+        valid = cv2.bitwise_not(cv2.inRange(small, median - exclude_range, median + exclude_range))
+        bitmaps.append((bitmap, valid))
+    
+    if len(bitmaps) < 2:
+        # Too few usable frames to judge motion, so align to be safe
+        return True
+    
+    for (prev, prev_valid), (curr, curr_valid) in zip(bitmaps, bitmaps[1:]):
+        valid = cv2.bitwise_and(prev_valid, curr_valid)
+        count = cv2.countNonZero(valid)
+        if count == 0:
+            continue
+        differing = cv2.bitwise_and(cv2.absdiff(prev, curr), valid)
+        if cv2.countNonZero(differing) / count > threshold:
+            return True
+    return False
+
+def merge_hdr_opencv(images_or_paths, exposure_times=None, output_dir="hdr_outputsopencv", output_prefix="HDR", tone_mapping=True, preview=False, align=True, calibration_scale=0.25,
+                     align_cache_key=None, response_cache_key=None, cache_dir="cache"):
     """
     Merge multiple exposure images into an HDR image using OpenCV and export as linear 16-bit TIFF.
+    
+    images_or_paths may mix file paths and already decoded BGR uint8 arrays.
+    With preview=True only the tone-mapped JPEGs are written (as *_preview.jpg); the HDR and TIFF masters are skipped.
+    align may be True, False (tripod captures) or "auto" to run MTB only when motion is detected.
+    The CRF is fitted on copies resized by calibration_scale; use 0.5 for extremely high-contrast scenes.
+    When align_cache_key is given, the aligned frames are stored under cache_dir and reused on later runs.
+    cache_dir=None disables the alignment and CRF caches.
+    The CRF is a property of the camera body, so with response_cache_key it is fitted once and reused.
     """
     # Create output directory if it doesn't exist
     if not os.path.exists(output_dir):
@@ -13,10 +104,13 @@ def merge_hdr_opencv(image_paths, exposure_times=None, output_dir="hdr_outputsop
     # Read images
     print("Reading images...")
     images = []
-    for img_path in image_paths:
-        im = cv2.imread(img_path)
+    for img in images_or_paths:
+        if isinstance(img, np.ndarray):
+            images.append(img)
+            continue
+        im = cv2.imread(img)
         if im is None:
-            print(f"Failed to read image: {img_path}")
+            print(f"Failed to read image: {img}")
             continue
         images.append(im)
     
@@ -34,14 +128,49 @@ def merge_hdr_opencv(image_paths, exposure_times=None, output_dir="hdr_outputsop
     print(f"Using exposure times: {exposure_times}")
     
 
-    print("Aligning images...")
-    alignMTB = cv2.createAlignMTB()
-    alignMTB.process(images, images)
+    if align == "auto":
+        align = _needs_alignment(images)
+        if not align:
+            print("No motion detected between exposures, skipping alignment")
+    
+    if align:
+        aligned_path = None
+        if align_cache_key is not None and cache_dir is not None:
+            aligned_path = _aligned_cache_path(cache_dir, align_cache_key)
+        
+        aligned = _load_npy(aligned_path) if aligned_path is not None else None
+        if aligned is not None:
+            print("Loaded cached aligned images")
+            images = list(aligned)
+        else:
+            print("Aligning images...")
+            alignMTB = cv2.createAlignMTB()
+            alignMTB.process(images, images)
+            
+            if aligned_path is not None:
+                _save_npy(aligned_path, np.stack(images))
     
 
-    print("Calculating Camera Response Function (CRF)...")
-    calibrateDebevec = cv2.createCalibrateDebevec()
-    responseDebevec = calibrateDebevec.process(images, exposure_times)
+    response_path = None
+    if response_cache_key is not None and cache_dir is not None:
+        response_path = os.path.join(cache_dir, "crf", f"{response_cache_key}.npy")
+    
+    responseDebevec = _load_npy(response_path, mmap_mode=None) if response_path is not None else None
+    if responseDebevec is not None:
+        print(f"Loaded cached Camera Response Function: {response_path}")
+    else:
+        print("Calculating Camera Response Function (CRF)...")
+        # The response curve only needs a pixel sample, so fit it on small copies
+        # and apply it to the full-resolution frames in the merge below
+        small_images = [
+            cv2.resize(img, None, fx=calibration_scale, fy=calibration_scale, interpolation=cv2.INTER_AREA)
+            for img in images
+        ]
+        calibrateDebevec = cv2.createCalibrateDebevec()
+        responseDebevec = calibrateDebevec.process(small_images, exposure_times)
+        
+        if response_path is not None:
+            _save_npy(response_path, responseDebevec)
     
 
     print("Merging images into one HDR image...")
@@ -49,59 +178,71 @@ def merge_hdr_opencv(image_paths, exposure_times=None, output_dir="hdr_outputsop
     hdrDebevec = mergeDebevec.process(images, exposure_times, responseDebevec)
     
 
-    hdr_path = os.path.join(output_dir, f"{output_prefix}.hdr")
-    cv2.imwrite(hdr_path, hdrDebevec)
-    print(f"Saved HDR image: {hdr_path}")
-    
-    print("Saving 16-bit linear TIFF...")
-    
+    hdr_path = None
+    tiff_path = None
+    if not preview:
+        hdr_path = os.path.join(output_dir, f"{output_prefix}.exr")
+        try:
+            # Clamp to the float16 maximum so outliers don't overflow to inf in the half-float EXR
+            saved = cv2.imwrite(hdr_path, np.minimum(hdrDebevec, np.finfo(np.float16).max), EXR_WRITE_PARAMS)
+        except cv2.error as e:
+            print(f"Error writing EXR: {e}")
+            saved = False
+        
+        if not saved:
+            # Not every OpenCV build ships an EXR writer; Radiance .hdr is always available
+            hdr_path = os.path.join(output_dir, f"{output_prefix}.hdr")
+            print("EXR output unavailable, saving Radiance HDR instead")
+            cv2.imwrite(hdr_path, hdrDebevec)
+        print(f"Saved HDR image: {hdr_path}")
+        
+        print("Saving 16-bit linear TIFF...")
+        
 
-    max_luminance = np.max(hdrDebevec)
-    print(f"Maximum HDR luminance value: {max_luminance}")
-    
-    if max_luminance > 0:
-        # Use 80% of the available range to avoid clipping
-        scale_factor = (0.8 * 65535) / max_luminance
-    else:
-        scale_factor = 1.0
-    
-    print(f"Using scale factor: {scale_factor}")
-    tiff_16bit = np.clip(hdrDebevec * scale_factor, 0, 65535).astype(np.uint16)
-    tiff_path = os.path.join(output_dir, f"{output_prefix}_16bit_linear.tiff")
-    cv2.imwrite(tiff_path, tiff_16bit)
-    print(f"Saved 16-bit linear TIFF: {tiff_path}")
+        _, max_luminance, _, _ = cv2.minMaxLoc(hdrDebevec.reshape(-1))
+        print(f"Maximum HDR luminance value: {max_luminance}")
+        
+        if max_luminance > 0:
+            # Use 80% of the available range to avoid clipping
+            scale_factor = (0.8 * 65535) / max_luminance
+        else:
+            scale_factor = 1.0
+        
+        print(f"Using scale factor: {scale_factor}")
+        # Scale and saturate to uint16 in one pass (a scalar cv2.multiply would only scale channel 0)
+        tiff_16bit = cv2.addWeighted(hdrDebevec, scale_factor, hdrDebevec, 0, 0, dtype=cv2.CV_16U)
+        tiff_path = os.path.join(output_dir, f"{output_prefix}_16bit_linear.tiff")
+        cv2.imwrite(tiff_path, tiff_16bit)
+        print(f"Saved 16-bit linear TIFF: {tiff_path}")
     
     # Apply tone mapping if requested
     tone_mapped_paths = {}
     if tone_mapping:
-        # Drago tone mapping
-        print("Tone mapping using Drago's method...")
-        tonemapDrago = cv2.createTonemapDrago(1.0, 0.7)
-        ldrDrago = tonemapDrago.process(hdrDebevec)
-        ldrDrago = 3 * ldrDrago
-        drago_path = os.path.join(output_dir, f"{output_prefix}_Drago.jpg")
-        cv2.imwrite(drago_path, ldrDrago * 255)
-        print(f"Saved Drago tone-mapped image: {drago_path}")
-        tone_mapped_paths['drago'] = drago_path
+        # (key, label, operator, gain) - gain is folded into the uint8 conversion
+        tonemappers = [
+            ('drago', "Drago", cv2.createTonemapDrago(1.0, 0.7), 3.0),
+            ('reinhard', "Reinhard", cv2.createTonemapReinhard(1.5, 0, 0, 0), 1.0),
+            ('mantiuk', "Mantiuk", cv2.createTonemapMantiuk(2.2, 0.85, 1.2), 3.0),
+        ]
         
-        # Reinhard tone mapping
-        print("Tone mapping using Reinhard's method...")
-        tonemapReinhard = cv2.createTonemapReinhard(1.5, 0, 0, 0)
-        ldrReinhard = tonemapReinhard.process(hdrDebevec)
-        reinhard_path = os.path.join(output_dir, f"{output_prefix}_Reinhard.jpg")
-        cv2.imwrite(reinhard_path, ldrReinhard * 255)
-        print(f"Saved Reinhard tone-mapped image: {reinhard_path}")
-        tone_mapped_paths['reinhard'] = reinhard_path
+        # Half-size preview JPEGs must not replace the full-resolution ones next to the masters
+        preview_suffix = "_preview" if preview else ""
         
-        # Mantiuk tone mapping
-        print("Tone mapping using Mantiuk's method...")
-        tonemapMantiuk = cv2.createTonemapMantiuk(2.2, 0.85, 1.2)
-        ldrMantiuk = tonemapMantiuk.process(hdrDebevec)
-        ldrMantiuk = 3 * ldrMantiuk
-        mantiuk_path = os.path.join(output_dir, f"{output_prefix}_Mantiuk.jpg")
-        cv2.imwrite(mantiuk_path, ldrMantiuk * 255)
-        print(f"Saved Mantiuk tone-mapped image: {mantiuk_path}")
-        tone_mapped_paths['mantiuk'] = mantiuk_path
+        # Workers only compute and write; all logging stays in this thread so lines don't interleave
+        def tone_map(label, tonemap, gain):
+            ldr = tonemap.process(hdrDebevec)
+            path = os.path.join(output_dir, f"{output_prefix}_{label}{preview_suffix}.jpg")
+            cv2.imwrite(path, cv2.convertScaleAbs(ldr, alpha=gain * 255.0), JPEG_WRITE_PARAMS)
+            return path
+        
+        # hdrDebevec is only read, and OpenCV releases the GIL, so the three run concurrently
+        print(f"Tone mapping using {', '.join(label for _, label, _, _ in tonemappers)} methods...")
+        with ThreadPoolExecutor(max_workers=len(tonemappers)) as executor:
+            futures = [(key, label, executor.submit(tone_map, label, tonemap, gain))
+                       for key, label, tonemap, gain in tonemappers]
+            for key, label, future in futures:
+                tone_mapped_paths[key] = future.result()
+                print(f"Saved {label} tone-mapped image: {tone_mapped_paths[key]}")
     
     # Return paths to saved files
     return {
@@ -114,19 +255,94 @@ def merge_hdr_opencv(image_paths, exposure_times=None, output_dir="hdr_outputsop
         }
     }
 
-def extract_exposure_time_from_raw(cr2_file):
+def _load_exif_cache():
+    try:
+        with open(EXIF_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _store_exif_cache(exposures):
+    """
+    Merge {path: exposure time} into the JSON cache with one atomic write.
+    
+    Only the parent calls this, once the decode pool has finished, so concurrent workers
+    never overwrite each other's entries.
+    """
+    entries = _load_exif_cache()
+    changed = False
+    for path, value in exposures.items():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entry = {'mtime': stat.st_mtime, 'size': stat.st_size, 'value': float(value)}
+        key = os.path.abspath(path)
+        if entries.get(key) != entry:
+            entries[key] = entry
+            changed = True
+    
+    if not changed:
+        return
+    
+    # The cache is only an optimisation, so an unwritable location must not fail the scene
+    tmp_path = f"{EXIF_CACHE_PATH}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(EXIF_CACHE_PATH), exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, EXIF_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: could not write exposure time cache {EXIF_CACHE_PATH}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def _exif_disk_cache(func):
+    """
+    Serve exposure-time lookups from the JSON cache, invalidated by the file's mtime and size.
+    
+    The JSON is loaded once per process and only read here; misses fall through to func and
+    are recorded by the caller through _store_exif_cache.
+    """
+    entries = None
+    
+    @functools.wraps(func)
+    def wrapper(path, *args, **kwargs):
+        nonlocal entries
+        if entries is None:
+            entries = _load_exif_cache()
+        
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Let func report the unreadable file and return None as it always has
+            return func(path, *args, **kwargs)
+        entry = entries.get(os.path.abspath(path))
+        if entry and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+            return entry['value']
+        return func(path, *args, **kwargs)
+    
+    return wrapper
+
+@_exif_disk_cache
+def extract_exposure_time_from_raw(cr2_file, raw=None, data=None):
     """
     Extract exposure time from RAW file metadata.
     
     Parameters:
     cr2_file (str): Path to CR2 file
+    raw (rawpy.RawPy): Already opened reader for cr2_file, reused instead of opening it again
+    data (bytes): Contents of cr2_file, parsed in memory instead of re-reading the file
     
     Returns:
     float: Exposure time in seconds
     """
     try:
-        import rawpy
-        raw = rawpy.imread(cr2_file)
+        if raw is None:
+            import rawpy
+            raw = rawpy.imread(cr2_file)
         
         # rawpy
         try:
@@ -139,7 +355,7 @@ def extract_exposure_time_from_raw(cr2_file):
         # exifread
         try:
             import exifread
-            with open(cr2_file, 'rb') as f:
+            with (io.BytesIO(data) if data is not None else open(cr2_file, 'rb')) as f:
                 tags = exifread.process_file(f)
                 
                 if 'EXIF ExposureTime' in tags:
@@ -163,7 +379,7 @@ def extract_exposure_time_from_raw(cr2_file):
             from PIL import Image
             from PIL.ExifTags import TAGS
             
-            with Image.open(cr2_file) as img:
+            with Image.open(io.BytesIO(data) if data is not None else cr2_file) as img:
                 exif_data = img._getexif()
                 if exif_data:
                     for tag_id, value in exif_data.items():
@@ -183,19 +399,143 @@ def extract_exposure_time_from_raw(cr2_file):
     print(f"Could not extract exposure time from {os.path.basename(cr2_file)}")
     return None
 
-def process_cr2_files(dataset_path, scene_id, output_dir="hdr_outputsopencv"):
+# OpenCV names Bayer codes after the second row of the CFA, so an RGGB sensor maps to BayerBG
+_BAYER_CODES = {
+    "RGGB": cv2.COLOR_BayerBG2BGR_EA,
+    "BGGR": cv2.COLOR_BayerRG2BGR_EA,
+    "GRBG": cv2.COLOR_BayerGB2BGR_EA,
+    "GBRG": cv2.COLOR_BayerGR2BGR_EA,
+}
+
+def _normalize_bayer(raw):
+    """
+    Black-subtract, white-balance and scale the visible Bayer mosaic to uint8.
+    """
+    colors = raw.raw_colors_visible
+    black = np.array(raw.black_level_per_channel, dtype=np.float32)
+    wb = np.array(raw.camera_whitebalance, dtype=np.float32)
+    if wb[3] == 0:
+        wb[3] = wb[1]
+    gain = (wb / wb[1]) * 255.0 / (raw.white_level - black)
+    
+    mosaic = raw.raw_image_visible.astype(np.float32)
+    mosaic -= black[colors]
+    mosaic *= gain[colors]
+    np.clip(mosaic, 0, 255, out=mosaic)
+    return mosaic.astype(np.uint8)
+
+def _camera_to_srgb(raw):
+    """
+    LibRaw's camera RGB -> linear sRGB matrix, reordered to act on BGR pixels with cv2.transform.
+    """
+    rgb_cam = np.array(raw.color_matrix, dtype=np.float32)[:, :3]
+    if not rgb_cam.any():
+        return np.eye(3, dtype=np.float32)
+    # Columns follow the camera's colour indices (color_desc), rows are sRGB R, G, B
+    columns = [bytes(raw.color_desc).index(c) for c in b'BGR']
+    return np.ascontiguousarray(rgb_cam[::-1][:, columns])
+
+def _bin_bayer(mosaic, pattern):
+    """
+    Collapse each 2x2 CFA cell into one BGR pixel (the equivalent of LibRaw's half_size).
+    """
+    h, w = mosaic.shape[0] // 2 * 2, mosaic.shape[1] // 2 * 2
+    cells = {'R': [], 'G': [], 'B': []}
+    for i, channel in enumerate(pattern):
+        dy, dx = divmod(i, 2)
+        cells[channel].append(np.ascontiguousarray(mosaic[dy:h:2, dx:w:2]))
+    green = cv2.addWeighted(cells['G'][0], 0.5, cells['G'][1], 0.5, 0)
+    return cv2.merge([cells['B'][0], green, cells['R'][0]])
+
+def _decode_with_exif(cr2_path, preview=False, cache_dir="cache"):
+    """
+    Decode a CR2 file to an 8-bit linear BGR .npy file, reusing the cached copy when the file is unchanged.
+    
+    The file is read from disk once and that buffer serves both the rawpy decode and the EXIF lookup.
+    
+    Demosaicing is done by OpenCV's edge-aware Bayer conversion on the raw mosaic, followed by
+    the camera's colour matrix in a single cv2.transform pass so the output is linear sRGB.
+    LibRaw's gamma curve is skipped since CalibrateDebevec fits the tone response itself.
+    
+    Parameters:
+    cr2_path (str): Path to CR2 file
+    preview (bool): Decode at half resolution by averaging each 2x2 Bayer cell
+    cache_dir (str): Folder holding decoded arrays as .npy files
+    
+    Returns:
+    tuple: (path to the cached .npy holding the BGR image, exposure time in seconds or None)
+    """
+    stat = os.stat(cr2_path)
+    key = hashlib.blake2b(
+        f"{os.path.abspath(cr2_path)}:{stat.st_mtime}:{stat.st_size}:half={preview}:wb=camera:demosaic=ea:cm=srgb".encode()
+    ).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{key}.npy")
+    
+    if _load_npy(cache_path) is not None:
+        print(f"Using cached decode for {os.path.basename(cr2_path)}")
+        return cache_path, extract_exposure_time_from_raw(cr2_path)
+    
+    import rawpy
+    
+    with open(cr2_path, 'rb') as f:
+        data = f.read()
+    
+    with rawpy.imread(io.BytesIO(data)) as raw:
+        exposure_time = extract_exposure_time_from_raw(cr2_path, raw=raw, data=data)
+        pattern = ''.join(chr(raw.color_desc[c]) for c in raw.raw_colors_visible[:2, :2].ravel())
+        if pattern not in _BAYER_CODES:
+            raise ValueError(f"Unsupported CFA pattern: {pattern}")
+        mosaic = _normalize_bayer(raw)
+        color_matrix = _camera_to_srgb(raw)
+    
+    if preview:
+        bgr = _bin_bayer(mosaic, pattern)
+    else:
+        bgr = cv2.cvtColor(mosaic, _BAYER_CODES[pattern])
+    # A per-channel CRF can't undo a 3x3 colour-space mix, so convert camera RGB to sRGB here
+    bgr = cv2.transform(bgr, color_matrix)
+    
+    _save_npy(cache_path, bgr)
+    return cache_path, exposure_time
+
+def _camera_model(cr2_file):
+    """
+    Read the camera model from EXIF, or None if it can't be determined.
+    """
+    try:
+        import exifread
+        with open(cr2_file, 'rb') as f:
+            tags = exifread.process_file(f, stop_tag='Image Model', details=False)
+        model = tags.get('Image Model')
+        return str(model).strip() if model else None
+    except ImportError:
+        print("exifread not installed, Camera Response Function will not be cached")
+    except Exception as e:
+        print(f"Error reading camera model: {e}")
+    return None
+
+def process_cr2_files(dataset_path, scene_id, output_dir="hdr_outputsopencv", preview=False, align=False,
+                      cache_dir="cache"):
     """
     Process CR2 photos in a scene folder to create an HDR image.
+    
+    preview=True decodes at half resolution and only writes the tone-mapped JPEGs,
+    which is about 4x less work for every stage after the decode.
+    align defaults to False because the SIHDR/Kalantari sets are tripod-captured;
+    pass True or "auto" for handheld brackets.
+    cache_dir holds decoded frames, aligned stacks and CRFs across runs. Each entry is full
+    size and is never evicted; pass None to disable caching (frames then go through a temp folder).
     """
     scene_path = os.path.join(dataset_path, scene_id)
     
-    if not os.path.exists(scene_path):
+    # Find files; scandir doubles as the existence check
+    try:
+        with os.scandir(scene_path) as entries:
+            image_files = sorted(e.path for e in entries if e.name.endswith('.CR2'))
+    except FileNotFoundError:
         print(f"Error: The folder '{scene_path}' does not exist.")
         return None
     
-    # Find files
-    image_files = sorted([os.path.join(scene_path, f) for f in os.listdir(scene_path) if f.endswith('.CR2')])
-    
     if not image_files:
         print(f"Error: No RAW (.CR2) found in {scene_path}.")
         return None
@@ -203,71 +543,114 @@ def process_cr2_files(dataset_path, scene_id, output_dir="hdr_outputsopencv"):
     file_names = [f"'{os.path.basename(f)}'" for f in image_files]
     print(f"Processing files: [{', '.join(file_names)}]")
     
-    # Real exp using metadata 
-    exposure_times = []
-    for cr2_file in image_files:
-        exposure_time = extract_exposure_time_from_raw(cr2_file)
-        
-        if exposure_time is not None:
-            exposure_times.append(exposure_time)
-        else:
-            # Relative exp
-            default_exposures = [1/8000.0, 1/1000.0, 1/125.0, 1/15.0, 1/2.0]
-            idx = len(exposure_times)
-            if idx < len(default_exposures):
-                fallback_exposure = default_exposures[idx]
-            else:
-                fallback_exposure = default_exposures[-1]
-            
-            print(f"Using relative exposure time for {os.path.basename(cr2_file)}: {fallback_exposure}")
-            exposure_times.append(fallback_exposure)
-    
-    # Convert CR2 to JPEG (OpenCV can't directly process CR2)
-    jpeg_files = []
-    for cr2_file in image_files:
-        jpeg_file = cr2_file.replace('.CR2', '.jpg')
-        
-        try:
-            import rawpy
-            import imageio
-            
-            with rawpy.imread(cr2_file) as raw:
-                rgb = raw.postprocess(
-                    use_camera_wb=True,
-                    half_size=False,
-                    no_auto_bright=True,
-                    output_color=rawpy.ColorSpace.sRGB
-                )
+    with (tempfile.TemporaryDirectory() if cache_dir is None else contextlib.nullcontext(cache_dir)) as decode_dir:
+        # Decode CR2 straight to BGR arrays (OpenCV can't directly process CR2) and read the
+        # real exposure from the metadata in the same pass.
+        # Demosaicing is CPU-bound and independent per frame, so spread it over cores.
+        # Workers hand back cache paths rather than pickling whole frames across processes.
+        decoded_files = []
+        decoded_paths = []
+        valid_exposures = []
+        metadata_exposures = {}
+        exposures_from_metadata = True
+        # Each worker keeps OpenCV single-threaded so the processes don't oversubscribe the cores
+        with ProcessPoolExecutor(max_workers=min(len(image_files), os.cpu_count() or 1),
+                                 initializer=cv2.setNumThreads, initargs=(1,)) as executor:
+            futures = [executor.submit(_decode_with_exif, cr2_file, preview, decode_dir)
+                       for cr2_file in image_files]
+            for idx, (cr2_file, future) in enumerate(zip(image_files, futures)):
+                try:
+                    npy_path, exposure_time = future.result()
+                except ImportError:
+                    print("rawpy module not found")
+                    return None
+                except Exception as e:
+                    print(f"Error processing {os.path.basename(cr2_file)}: {e}")
+                    continue
                 
-                imageio.imsave(jpeg_file, rgb)
+                if exposure_time is not None:
+                    metadata_exposures[cr2_file] = exposure_time
+                else:
+                    exposures_from_metadata = False
+                    # Relative exp
+                    default_exposures = [1/8000.0, 1/1000.0, 1/125.0, 1/15.0, 1/2.0]
+                    if idx < len(default_exposures):
+                        exposure_time = default_exposures[idx]
+                    else:
+                        exposure_time = default_exposures[-1]
+                    
+                    print(f"Using relative exposure time for {os.path.basename(cr2_file)}: {exposure_time}")
                 
-                jpeg_files.append(jpeg_file)
-                print(f"Converted {os.path.basename(cr2_file)} to JPEG")
-        except ImportError:
-            print("rawpy and/or imageio modules not found")
+                decoded_files.append(cr2_file)
+                decoded_paths.append(npy_path)
+                valid_exposures.append(exposure_time)
+                print(f"Decoded {os.path.basename(cr2_file)}")
+        
+        # Workers only read the EXIF cache; record their results here in a single write
+        _store_exif_cache(metadata_exposures)
+        
+        if len(decoded_paths) < 2:
+            print("Not enough valid images(minimum 2)")
             return None
-        except Exception as e:
-            print(f"Error processing {os.path.basename(cr2_file)}: {e}")
-    
-    if len(jpeg_files) < 2:
-        print("Not enough valid images(minimum 2)")
-        return None
+        
+        # Decode cache names already encode each file's path, mtime, size and decode settings
+        align_cache_key = hashlib.blake2b(':'.join(decoded_paths).encode() + b'mtb').hexdigest()
+        
+        aligned = None
+        if align and cache_dir is not None:
+            aligned = _load_npy(_aligned_cache_path(cache_dir, align_cache_key))
+        
+        if aligned is not None:
+            # The aligned stack already holds every frame, so the per-frame loads are skipped too
+            print("Loaded cached aligned images")
+            bgr_images = list(aligned)
+            align = False
+        else:
+            # Load every frame into one contiguous (N, H, W, 3) buffer and pass views of it on.
+            # A cache file that went bad since the worker checked it is decoded again.
+            def load_frame(cr2_file, npy_path):
+                frame = _load_npy(npy_path)
+                if frame is None:
+                    print(f"Cached decode for {os.path.basename(cr2_file)} is unreadable, decoding again")
+                    if os.path.exists(npy_path):
+                        os.remove(npy_path)
+                    frame = _load_npy(_decode_with_exif(cr2_file, preview, decode_dir)[0])
+                return frame
+            
+            first = load_frame(decoded_files[0], decoded_paths[0])
+            stack = np.empty((len(decoded_paths),) + first.shape, dtype=first.dtype)
+            stack[0] = first
+            for frame, cr2_file, npy_path in zip(stack[1:], decoded_files[1:], decoded_paths[1:]):
+                frame[...] = load_frame(cr2_file, npy_path)
+            bgr_images = list(stack)
     
-    exposure_times = exposure_times[:len(jpeg_files)]
-    exposure_times = np.array(exposure_times, dtype=np.float32)
+    exposure_times = np.array(valid_exposures, dtype=np.float32)
     
     print(f"Using extracted exposure times: {exposure_times}")
     
+    # Every frame comes from the same linear Bayer decode, so the CRF only varies with the body.
+    # A fit against fallback exposure times is wrong for this scene alone, so it is never cached.
+    response_cache_key = None
+    model = _camera_model(image_files[0]) if exposures_from_metadata else None
+    if model:
+        response_cache_key = re.sub(r'[^A-Za-z0-9._-]+', '_', model) + "_raw-linear-srgb"
+    
     hdr_path = merge_hdr_opencv(
-        jpeg_files, 
+        bgr_images, 
         exposure_times=exposure_times,
         output_dir=output_dir,
-        output_prefix=f"HDR_{scene_id}"
+        output_prefix=f"HDR_{scene_id}",
+        preview=preview,
+        align=align,
+        align_cache_key=align_cache_key,
+        response_cache_key=response_cache_key,
+        cache_dir=cache_dir
     )
     
     return hdr_path
 
 def main():
+    cv2.setNumThreads(os.cpu_count() or 1)
     
     def use_cr2():
         print("Using second approach with CR2 files and metadata extraction...")